@@ -0,0 +1,49 @@
+"""Read the data rows of a CSV with Arrow's multithreaded CSV reader.
+
+Backs the --engine pyarrow option of the cleaning scripts and of merge_inmet_focos. pyarrow is an optional
+dependency and is only imported when one of these readers is used.
+
+Compared with the pandas readers:
+ - rows must have exactly as many cells as the header (Arrow raises otherwise)
+ - undecodable bytes raise an error instead of being replaced with U+FFFD
+ - dialects with skipinitialspace are refused, as Arrow cannot strip the space after a delimiter
+"""
+
+import csv
+
+
+def _arrow_options(n_columns: int, dialect, encoding: str, float_columns=()):
+    """Return the Arrow read/parse/convert options for the header-less data rows, as columns '0'..'n_columns-1'."""
+    # optional dependency; every other column is declared as string so Arrow does not re-render numbers
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    if dialect.skipinitialspace:
+        raise ValueError("The pyarrow engine does not support dialects with skipinitialspace; use --engine c")
+    names = [str(i) for i in range(n_columns)]
+    return dict(
+        read_options=pacsv.ReadOptions(skip_rows=1, column_names=names, block_size=8 << 20, encoding=encoding),
+        parse_options=pacsv.ParseOptions(delimiter=dialect.delimiter, quote_char=dialect.quotechar or False,
+                                         double_quote=dialect.doublequote, escape_char=dialect.escapechar or False,
+                                         newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(
+            column_types={name: (pa.float64() if i in float_columns else pa.string()) for i, name in enumerate(names)}))
+
+
+def read_chunks_pyarrow(source, n_columns: int, dialect, encoding: str = "utf-8", float_columns=()):
+    """Yield the data rows of source (a path or binary file) as DataFrames of text columns 0..n_columns-1, parsed by Arrow.
+
+    Columns whose position is in float_columns are parsed as float64 instead, with empty cells as NaN.
+    """
+    import pyarrow.csv as pacsv
+    for batch in pacsv.open_csv(source, **_arrow_options(n_columns, dialect, encoding, float_columns)):
+        chunk = batch.to_pandas()
+        chunk.columns = range(n_columns)
+        yield chunk
+
+
+def read_table_pyarrow(source, column_names, dialect=csv.excel, encoding: str = "utf-8"):
+    """Return all data rows of source (a path or binary file) as one DataFrame of text columns labelled column_names."""
+    import pyarrow.csv as pacsv
+    frame = pacsv.read_csv(source, **_arrow_options(len(column_names), dialect, encoding)).to_pandas()
+    frame.columns = list(column_names)
+    return frame
@@ -0,0 +1,22 @@
+"""Move a rewritten CSV into place over its input, keeping the original as <input>.bak.
+
+Shared by the cleaning scripts for their default in-place mode.
+"""
+
+import os
+import shutil
+
+
+def backup_and_replace(temp_path: str, input_path: str) -> str:
+    """Keep input_path as input_path + '.bak', then move temp_path onto input_path; return the backup path."""
+    backup_path = input_path + ".bak"
+    if os.path.lexists(backup_path):
+        os.remove(backup_path)
+    try:
+        # the .bak is a second name for the original file; it keeps the old contents once temp replaces it
+        os.link(input_path, backup_path)
+    except OSError:
+        # no hard links here (e.g. some Windows or network filesystems)
+        shutil.copy2(input_path, backup_path)
+    os.replace(temp_path, input_path)
+    return backup_path
@@ -5,20 +5,28 @@ Une o arquivo INMET (Belo Horizonte Pampulha) com o arquivo de focos (gerado por
 por data e hora UTC — apenas linhas de focos cujo município corresponda a Belo Horizonte serão consideradas.
 
 Uso:
-  python merge_inmet_focos.py <inmet_csv> <focos_no_cols_csv> [output_csv]
+  python merge_inmet_focos.py <inmet_csv> <focos_no_cols_csv> [output_csv] [--engine {c,pyarrow}]
+
+--engine escolhe o leitor CSV do arquivo de focos (o maior dos dois): 'c' usa o pandas; 'pyarrow' usa o leitor
+multithread do Arrow e exige o pacote pyarrow instalado.
 
 O script detecta o cabeçalho do INMET pulando linhas de metadados, suporta o formato de data/hora do INMET
 (Ex.: Data: 2024/01/02, Hora UTC: 0600 UTC) e o formato do arquivo de focos (data DD/MM/YYYY, hora 'HHMM UTC').
 Gera um CSV com colunas do INMET seguidas das colunas de focos prefixadas com 'f_'.
 """
 from pathlib import Path
+import argparse
 import csv
-import sys
-from datetime import datetime
-import io
+import mmap
 import unicodedata
+from functools import lru_cache
+
+import pandas as pd
 
+from arrow_csv import read_table_pyarrow
 
+
+@lru_cache(maxsize=8192)
 def normalize_text(s: str) -> str:
     if s is None:
         return ""
@@ -29,162 +37,146 @@ def normalize_text(s: str) -> str:
     return s
 
 
+WRITE_BUFFER_SIZE = 1 << 20
+
+# normalized comparison strings, computed once
+BH_NORM = normalize_text('Belo Horizonte')
+# define nomes de risco a serem removidos (normalizados)
+RISCO_NAMES = frozenset(normalize_text(x) for x in ('risco_fogo', 'risco de fogo', 'riscofogo', 'risco'))
+
+
 def find_inmet_header_and_rows(path: Path):
+    # the file is mapped instead of decoded whole: only the metadata lines are scanned for the header,
+    # and pandas reads the data rows straight from the byte offset after it
+    with path.open('rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        header_line = None
+        pos = 0
+        while pos < len(mm):
+            end = mm.find(b'\n', pos)
+            if end == -1:
+                end = len(mm)
+            # header line contains Data and Hora (Hora UTC)
+            line = mm[pos:end]
+            if b'Data' in line and b'Hora' in line:
+                header_line = line.rstrip(b'\r')
+                break
+            pos = end + 1
+    if header_line is None:
+        raise ValueError('Cabeçalho do INMET não encontrado (linha com "Data" e "Hora").')
+    data_start = end + 1
+
     # try common encodings (utf-8, latin1, cp1252)
-    text = None
     for enc in ('utf-8', 'latin-1', 'cp1252'):
         try:
-            text = path.read_text(encoding=enc)
-            break
-        except Exception:
+            fieldnames = next(csv.reader([header_line.decode(enc)], delimiter=';'))
+            with path.open('rb') as f:
+                f.seek(data_start)
+                # data rows go to pandas as text; columns are addressed by position so the header is kept verbatim
+                rows = pd.read_csv(f, sep=';', header=None, names=range(len(fieldnames)),
+                                   usecols=range(len(fieldnames)), dtype=str, keep_default_na=False, encoding=enc)
+            return fieldnames, rows
+        except UnicodeDecodeError:
             continue
-    if text is None:
-        raise ValueError(f'Não foi possível ler o arquivo {path} com as codificações testadas')
-    lines = text.splitlines()
-    header_idx = None
-    for i, line in enumerate(lines):
-        # header line contains Data and Hora (Hora UTC)
-        if 'Data' in line and 'Hora' in line:
-            header_idx = i
-            break
-    if header_idx is None:
-        raise ValueError('Cabeçalho do INMET não encontrado (linha com "Data" e "Hora").')
-    data_lines = lines[header_idx:]
-    # use csv reader with semicolon delimiter
-    buf = io.StringIO('\n'.join(data_lines))
-    reader = csv.DictReader(buf, delimiter=';')
-    rows = list(reader)
-    return reader.fieldnames, rows
-
-
-def read_focos(path: Path):
-    # focos file expected to be comma-separated
-    with path.open('r', encoding='utf-8', newline='') as f:
-        reader = csv.DictReader(f)
-        rows = list(reader)
-        return reader.fieldnames, rows
-
-
-def parse_inmet_datetime(date_str: str, hour_str: str):
-    # date_str example: '2024/01/02'
-    # hour_str example: '0600 UTC' or '0000 UTC'
-    if not date_str:
-        return None
-    try:
-        d = datetime.strptime(date_str.strip(), '%Y/%m/%d')
-    except Exception:
-        return None
-    if not hour_str:
-        return None
-    # remove ' UTC' suffix if present
-    h = hour_str.replace('UTC', '').strip()
-    # h like '0600' or '06:00'
-    h = h.replace(':', '')
-    try:
-        hour = int(h)
-    except Exception:
-        return None
+    raise ValueError(f'Não foi possível ler o arquivo {path} com as codificações testadas')
+
+
+def read_focos(path: Path, engine: str = 'c'):
+    # focos file expected to be comma-separated; every column is kept as text
+    if engine == 'pyarrow':
+        with path.open('r', encoding='utf-8', newline='') as f:
+            header = next(csv.reader(f))
+        focos = read_table_pyarrow(path, header, encoding='utf-8')
+    else:
+        focos = pd.read_csv(path, dtype=str, keep_default_na=False, encoding='utf-8')
+    return list(focos.columns), focos
+
+
+def pack_datetime_key(year, month, day, hour):
+    # packs date and hour into a single integer (YYYYMMDDHH); works on scalars and on whole columns
+    return year * 1_000_000 + month * 10_000 + day * 100 + hour
+
+
+def datetime_keys(date_col: pd.Series, hour_col: pd.Series, date_format: str) -> pd.Series:
+    # date_col example: '02/01/2024' (focos, '%d/%m/%Y') or '2024/01/02' (INMET, '%Y/%m/%d')
+    # hour_col example: '0600 UTC', '0600' or '06:00'
+    # returns the packed key of each row, or <NA> where date or hour cannot be parsed
+    d = pd.to_datetime(date_col.str.strip(), format=date_format, errors='coerce')
+    h = hour_col.str.replace('UTC', '', regex=False).str.strip().str.replace(':', '', regex=False)
     # hour is HHMM -> convert to hour integer
-    hour_int = hour // 100
-    return datetime(d.year, d.month, d.day, hour_int)
-
-
-def parse_focos_datetime(date_str: str, hora_utc_str: str):
-    # date_str example: '02/01/2024'
-    # hora_utc_str example: '0600 UTC' or '0600'
-    if not date_str:
-        return None
-    try:
-        d = datetime.strptime(date_str.strip(), '%d/%m/%Y')
-    except Exception:
-        return None
-    if not hora_utc_str:
-        return None
-    h = hora_utc_str.replace('UTC', '').strip()
-    h = h.replace(':', '')
-    try:
-        hour = int(h)
-    except Exception:
-        return None
-    hour_int = hour // 100
-    return datetime(d.year, d.month, d.day, hour_int)
-
-
-def merge(inmet_path: Path, focos_path: Path, out_path: Path):
+    hour_int = pd.to_numeric(h, errors='coerce') // 100
+    keys = pack_datetime_key(d.dt.year, d.dt.month, d.dt.day, hour_int)
+    return keys.where(d.notna() & hour_int.between(0, 23)).astype('Int64')
+
+
+def merge(inmet_path: Path, focos_path: Path, out_path: Path, engine: str = 'c'):
     print('Lendo INMET:', inmet_path)
     inmet_fields, inmet_rows = find_inmet_header_and_rows(inmet_path)
     print(f'Linhas INMET lidas: {len(inmet_rows)}')
 
     print('Lendo focos:', focos_path)
-    focos_fields, focos_rows = read_focos(focos_path)
+    focos_fields, focos_rows = read_focos(focos_path, engine=engine)
     print(f'Linhas focos lidas: {len(focos_rows)}')
 
     # Filter out unwanted focos fields (remove risco de fogo) and normalize focos by datetime and municipio == Belo Horizonte
-    # define nomes de risco a serem removidos (normalizados)
-    risco_names = {normalize_text(x) for x in ('risco_fogo', 'risco de fogo', 'riscofogo', 'risco')}
-
     # build filtered focos_fields (preserve order)
     focos_fields_filtered = []
     for f in focos_fields:
-        if normalize_text(f).replace(' ', '') in risco_names:
-            continue
-        if normalize_text(f) in risco_names:
+        norm = normalize_text(f)
+        if norm.replace(' ', '') in RISCO_NAMES or norm in RISCO_NAMES:
             continue
         focos_fields_filtered.append(f)
 
-    focos_index = {}
-    for r in focos_rows:
-        municipio = r.get('municipio') or r.get('Municipio') or r.get('MUNICIPIO')
-        if municipio is None:
-            municipio = ''
-        if normalize_text(municipio) != normalize_text('Belo Horizonte'):
-            continue
-        dt = parse_focos_datetime(r.get('data', ''), r.get('hora_utc', ''))
-        if dt is None:
-            continue
-        # create a reduced record containing only filtered fields
-        reduced = {f: r.get(f, '') for f in focos_fields_filtered}
-        focos_index.setdefault(dt, []).append(reduced)
+    # keep only focos in Belo Horizonte; normalize_text runs once per distinct municipio, not once per row
+    municipio_col = next((c for c in ('municipio', 'Municipio', 'MUNICIPIO') if c in focos_rows.columns), None)
+    if municipio_col is None:
+        focos_rows = focos_rows.iloc[0:0]
+    else:
+        bh_names = [m for m in focos_rows[municipio_col].unique() if normalize_text(m) == BH_NORM]
+        focos_rows = focos_rows[focos_rows[municipio_col].isin(bh_names)]
 
-    print(f'Focos em Belo Horizonte (horas únicas): {len(focos_index)}')
+    blank = pd.Series('', index=focos_rows.index, dtype=str)
+    keys = datetime_keys(focos_rows.get('data', blank), focos_rows.get('hora_utc', blank), '%d/%m/%Y')
+    valid = keys.notna().to_numpy()
+    focos_rows = focos_rows[valid]
+    keys = keys[valid].to_numpy(dtype='int64')
+
+    print(f'Focos em Belo Horizonte (horas únicas): {len(pd.unique(keys))}')
 
     # build output header: INMET fields + prefixed focos fields
     pref = 'f_'
     focos_prefixed = [pref + f for f in focos_fields_filtered]
     out_fields = list(inmet_fields) + focos_prefixed
 
-    written = 0
-    with out_path.open('w', encoding='utf-8-sig', newline='') as wf:
-        writer = csv.writer(wf)
-        writer.writerow(out_fields)
-        for ir in inmet_rows:
-            inmet_date = ir.get(inmet_fields[0])  # 'Data'
-            inmet_hour = ir.get(inmet_fields[1])  # 'Hora UTC'
-            dt = parse_inmet_datetime(inmet_date, inmet_hour)
-            if dt is None:
-                continue
-            matches = focos_index.get(dt)
-            if not matches:
-                continue
-            # for each matching foco, write a merged row
-            for fr in matches:
-                out_row = [ir.get(f, '') for f in inmet_fields]
-                out_row += [fr.get(f, '') for f in focos_fields_filtered]
-                writer.writerow(out_row)
-                written += 1
+    # keys for every INMET row ('Data', 'Hora UTC'); unparseable rows get -1 and never match
+    inmet_keys = datetime_keys(inmet_rows[0], inmet_rows[1], '%Y/%m/%d').fillna(-1).to_numpy(dtype='int64')
+
+    # hash join on the packed key; an inner merge keeps INMET row order, with each row's focos in file order.
+    # only narrow (key, row position) tables go through the join; the INMET and focos columns are then
+    # gathered column by column from those positions
+    pairs = pd.DataFrame({'__key': inmet_keys, 'inmet_row': range(len(inmet_keys))}).merge(
+        pd.DataFrame({'__key': keys, 'focos_row': range(len(keys))}), on='__key', how='inner', sort=False)
+    merged = pd.concat([inmet_rows.take(pairs['inmet_row']).reset_index(drop=True),
+                        focos_rows[focos_fields_filtered].take(pairs['focos_row']).reset_index(drop=True)], axis=1)
+
+    with out_path.open('w', encoding='utf-8-sig', newline='', buffering=WRITE_BUFFER_SIZE) as wf:
+        merged.to_csv(wf, header=out_fields, index=False, lineterminator='\r\n')
+    written = len(merged)
 
     print(f'Linhas escritas no arquivo de saída: {written}')
 
 
 if __name__ == '__main__':
-    if len(sys.argv) < 3:
-        print('Uso: python merge_inmet_focos.py <inmet_csv> <focos_no_cols_csv> [output_csv]')
-        sys.exit(1)
-    inmet = Path(sys.argv[1])
-    focos = Path(sys.argv[2])
-    if len(sys.argv) >= 4:
-        out = Path(sys.argv[3])
+    parser = argparse.ArgumentParser(description='Une o arquivo INMET com o arquivo de focos por data e hora UTC')
+    parser.add_argument('inmet_csv', type=Path)
+    parser.add_argument('focos_no_cols_csv', type=Path)
+    parser.add_argument('output_csv', type=Path, nargs='?')
+    parser.add_argument('--engine', choices=('c', 'pyarrow'), default='c', help='Leitor CSV do arquivo de focos (padrão c)')
+    args = parser.parse_args()
+    inmet = args.inmet_csv
+    focos = args.focos_no_cols_csv
+    if args.output_csv is not None:
+        out = args.output_csv
     else:
         out = focos.with_name(focos.stem + '_merged_with_inmet.csv')
 
-    merge(inmet, focos, out)
+    merge(inmet, focos, out, engine=args.engine)
@@ -10,17 +10,31 @@ Options:
     --column    column name to encode (default: f_bioma)
     --no-inplace write output to path.cleaned.csv instead of overwriting
     --encoding  file encoding (default utf-8)
+    --dialect   CSV dialect of the input (default excel)
+    --workers   worker processes for the transform pass (default 1)
+    --chunksize rows read per chunk (default 200000)
+    --engine    CSV reader: c (pandas, default) or pyarrow (needs pyarrow and rows as long as the header)
 
-This script is streaming-friendly and uses two passes: first to collect categories, second to write output.
+This script is streaming-friendly and uses two passes over chunks of rows: the first parses only the encoded
+column to collect the categories, the second builds the one-hot columns of each chunk at once and writes it.
 """
 
 import argparse
 import csv
 import os
-import shutil
 import tempfile
 import unicodedata
 import re
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from arrow_csv import read_chunks_pyarrow
+from backup import backup_and_replace
+from parallel_map import check_row_widths, dialect_read_kwargs, dialect_write_kwargs, parallel_map
+
+CHUNK_SIZE = 200_000
 
 
 def sanitize_colname(s: str) -> str:
@@ -37,56 +51,38 @@ def sanitize_colname(s: str) -> str:
     return s
 
 
-def collect_categories(input_path: str, column_name: str, encoding: str = "utf-8"):
-    categories = []
-    seen = set()
+def read_header(input_path: str, column_name: str, encoding: str = "utf-8", dialect=csv.excel):
+    """Read only the header line; return the header and the index of column_name."""
     with open(input_path, "r", newline="", encoding=encoding, errors="replace") as fh:
-        sample = fh.read(8192)
-        fh.seek(0)
-        try:
-            dialect = csv.Sniffer().sniff(sample)
-        except Exception:
-            dialect = csv.excel
         reader = csv.reader(fh, dialect)
         try:
             header = next(reader)
         except StopIteration:
             raise ValueError("Input CSV is empty")
 
-        # find index (case-sensitive exact match first, then case-insensitive)
-        idx = None
-        if column_name in header:
-            idx = header.index(column_name)
-        else:
-            lowered = [h.lower() for h in header]
-            if column_name.lower() in lowered:
-                idx = lowered.index(column_name.lower())
+    idx = find_column_index(header, column_name)
+    if idx is None:
+        raise ValueError(f"Column '{column_name}' not found in header")
 
-        if idx is None:
-            raise ValueError(f"Column '{column_name}' not found in header")
+    return header, idx
 
-        for row in reader:
-            if len(row) <= idx:
-                val = ""
-            else:
-                val = row[idx].strip()
-            if val != "" and val not in seen:
-                seen.add(val)
-                categories.append(val)
 
-    return header, idx, categories
+def find_column_index(header, column_name: str):
+    # find index (case-sensitive exact match first, then case-insensitive); None if absent
+    if column_name in header:
+        return header.index(column_name)
+    lowered = [h.lower() for h in header]
+    if column_name.lower() in lowered:
+        return lowered.index(column_name.lower())
+    return None
 
 
-def one_hot_encode(input_path: str, column_name: str = "f_bioma", inplace: bool = True, encoding: str = "utf-8"):
-    input_path = os.path.abspath(input_path)
-    if not os.path.exists(input_path):
-        raise FileNotFoundError(f"Input file not found: {input_path}")
+def collect_categories(values: pd.Series):
+    # non-empty stripped values in first-seen order (unique() is a hashtable pass that keeps order of appearance)
+    return values[values != ""].unique().tolist()
 
-    header, col_idx, categories = collect_categories(input_path, column_name, encoding=encoding)
-    if not categories:
-        print("No non-empty categories found in column; nothing to encode.")
-        return 0
 
+def sanitize_categories(categories):
     # sanitize category names to make safe column names and ensure uniqueness
     sanitized = []
     used = set()
@@ -99,50 +95,86 @@ def one_hot_encode(input_path: str, column_name: str = "f_bioma", inplace: bool
             i += 1
         used.add(name)
         sanitized.append((cat, name))
+    return sanitized
+
+
+def one_hot_matrix(values: pd.Series, categories) -> np.ndarray:
+    """Return an int8 matrix with one row per value and one column per category (in `categories` order)."""
+    # codes follow the order of `categories`; empty values get -1 and keep an all-zero row
+    codes = pd.Index(categories).get_indexer(values)
+    rows = np.flatnonzero(codes >= 0)
+    onehots = np.zeros((len(codes), len(categories)), dtype=np.int8)
+    onehots[rows, codes[rows]] = 1
+    return onehots
+
+
+def encode_chunk(col_idx: int, categories, chunk: pd.DataFrame):
+    """Replace column col_idx of a chunk by its one-hot columns (appended at the end); count is always 0."""
+    onehots = pd.DataFrame(one_hot_matrix(chunk[col_idx].str.strip(), categories), index=chunk.index)
+    return pd.concat([chunk.drop(columns=[col_idx]), onehots], axis=1), 0
+
+
+def one_hot_encode(input_path: str, column_name: str = "f_bioma", inplace: bool = True, encoding: str = "utf-8",
+                   dialect: str = "excel", workers: int = 1, engine: str = "c", chunksize: int = CHUNK_SIZE):
+    input_path = os.path.abspath(input_path)
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(f"Input file not found: {input_path}")
+
+    dialect = csv.get_dialect(dialect)
+    header, col_idx = read_header(input_path, column_name, encoding=encoding, dialect=dialect)
+    check_row_widths(input_path, len(header), dialect, encoding)
+
+    use_arrow = engine == "pyarrow" and workers <= 1
+
+    # first pass: only the encoded column is parsed, chunk by chunk; categories keep their first-seen order
+    if use_arrow:
+        columns = (chunk[col_idx] for chunk in read_chunks_pyarrow(input_path, len(header), dialect, encoding))
+    else:
+        columns = (chunk[col_idx] for chunk in pd.read_csv(
+            input_path, skiprows=1, chunksize=chunksize,
+            **dialect_read_kwargs(dialect, len(header), encoding, usecols=[col_idx])))
+    seen = {}
+    for values in columns:
+        seen.update(dict.fromkeys(collect_categories(values.str.strip())))
+    categories = list(seen)
+    if not categories:
+        print("No non-empty categories found in column; nothing to encode.")
+        return 0
+
+    sanitized = sanitize_categories(categories)
 
     # prepare temp output
     fd, temp_path = tempfile.mkstemp(prefix="onehot_bioma_", suffix=".csv", dir=os.path.dirname(input_path))
     os.close(fd)
 
-    with open(input_path, "r", newline="", encoding=encoding, errors="replace") as inf:
-        sample = inf.read(8192)
-        inf.seek(0)
-        try:
-            dialect = csv.Sniffer().sniff(sample)
-        except Exception:
-            dialect = csv.excel
-
-        reader = csv.reader(inf, dialect)
-        orig_header = next(reader)
-
-        # Build new header: keep original columns except the f_bioma column, then append one-hot columns
-        new_header = [c for i, c in enumerate(orig_header) if i != col_idx]
-        new_header += [f"bioma_{name}" for (_, name) in sanitized]
+    # Build new header: keep original columns except the f_bioma column, then append one-hot columns
+    new_header = [c for i, c in enumerate(header) if i != col_idx]
+    new_header += [f"bioma_{name}" for (_, name) in sanitized]
 
+    if workers > 1:
+        parallel_map(partial(encode_chunk, col_idx, categories), input_path, temp_path, new_header, len(header),
+                     dialect=dialect, encoding=encoding, workers=workers)
+    else:
+        # second pass: every chunk is encoded and written before the next one is read
+        if use_arrow:
+            reader = read_chunks_pyarrow(input_path, len(header), dialect, encoding)
+        else:
+            reader = pd.read_csv(input_path, skiprows=1, chunksize=chunksize,
+                                 **dialect_read_kwargs(dialect, len(header), encoding))
         with open(temp_path, "w", newline="", encoding=encoding) as outf:
-            writer = csv.writer(outf, dialect)
-            writer.writerow(new_header)
-            for row in reader:
-                # pad
-                if len(row) < len(orig_header):
-                    row = row + [""] * (len(orig_header) - len(row))
-                base_row = [cell for i, cell in enumerate(row) if i != col_idx]
-                val = row[col_idx].strip() if len(row) > col_idx else ""
-                onehots = []
-                for (cat, name) in sanitized:
-                    onehots.append("1" if val != "" and val == cat else "0")
-                writer.writerow(base_row + onehots)
+            csv.writer(outf, dialect).writerow(new_header)
+            for chunk in reader:
+                out, _ = encode_chunk(col_idx, categories, chunk)
+                out.to_csv(outf, header=False, index=False, **dialect_write_kwargs(dialect))
 
     # backup and move
     if inplace:
-        backup_path = input_path + ".bak"
-        shutil.copy2(input_path, backup_path)
-        shutil.move(temp_path, input_path)
+        backup_path = backup_and_replace(temp_path, input_path)
         print(f"One-hot encoded {len(sanitized)} categories for column '{column_name}'. Backup: {backup_path}")
         return len(sanitized)
     else:
         out_name = input_path.replace('.csv', '.onehot.csv')
-        shutil.move(temp_path, out_name)
+        os.replace(temp_path, out_name)
         print(f"One-hot encoded {len(sanitized)} categories for column '{column_name}'. Output: {out_name}")
         return len(sanitized)
 
@@ -153,10 +185,18 @@ if __name__ == "__main__":
     parser.add_argument("--column", default="f_bioma", help="Column name to one-hot encode (default f_bioma)")
     parser.add_argument("--no-inplace", dest="inplace", action="store_false", help="Do not overwrite original; write to a new file")
     parser.add_argument("--encoding", default="utf-8", help="File encoding (default utf-8)")
+    parser.add_argument("--dialect", default="excel", choices=csv.list_dialects(), help="CSV dialect of the input (default excel: comma-delimited)")
+    parser.add_argument("--engine", choices=("c", "pyarrow"), default="c",
+                        help="CSV reader: 'c' (pandas, default) or 'pyarrow' (Arrow, multithreaded; requires pyarrow)")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE, help=f"Rows read per chunk (default {CHUNK_SIZE})")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes; above 1 the rows are split across processes with the pandas reader, "
+                             "whatever --engine says (default 1)")
     args = parser.parse_args()
 
     try:
-        one_hot_encode(args.input, column_name=args.column, inplace=args.inplace, encoding=args.encoding)
+        one_hot_encode(args.input, column_name=args.column, inplace=args.inplace, encoding=args.encoding,
+                       dialect=args.dialect, workers=args.workers, engine=args.engine, chunksize=args.chunksize)
     except Exception as e:
         print("Error:", e)
         raise
@@ -0,0 +1,129 @@
+"""Apply a chunk transformation to the rows of a CSV in parallel worker processes.
+
+The data rows (everything after the header line) are split into byte ranges that end on a newline.
+Each range is parsed with pandas and transformed in its own process and written to a part file, and
+the parts are concatenated in order after the new header.
+The cleaning scripts use this through their --workers option.
+
+Assumes no quoted field contains a line break, which holds for the CSVs produced by this pipeline.
+"""
+
+import codecs
+import csv
+import io
+import mmap
+import os
+import shutil
+import tempfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+# target size of the byte range handled by one task
+PART_SIZE = 64 << 20
+
+
+def check_row_widths(input_path: str, n_columns: int, dialect=csv.excel, encoding: str = "utf-8") -> int:
+    """Raise ValueError if a row of input_path has more than n_columns cells; return the number of shorter rows.
+
+    The pandas readers keep the first n_columns cells of a row, so extra cells would be lost without notice.
+    """
+    # rows are only measured; map and Counter keep the loop over the csv reader in C.
+    # Quotes are honoured whatever the dialect's output quoting, as pandas does
+    with open(input_path, "r", newline="", encoding=encoding, errors="replace") as fh:
+        widths = Counter(map(len, csv.reader(fh, dialect, quoting=csv.QUOTE_MINIMAL)))
+    wide = sum(count for width, count in widths.items() if width > n_columns)
+    if wide:
+        raise ValueError(f"{wide} row(s) have more cells than the header ({n_columns}); "
+                         "fix them before cleaning so their extra cells are not lost")
+    # blank lines (no cells) are skipped by the readers
+    return sum(count for width, count in widths.items() if 0 < width < n_columns)
+
+
+def dialect_read_kwargs(dialect, n_columns: int, encoding: str = "utf-8", dtype=str, na_values=None,
+                        usecols=None) -> dict:
+    """Return the read_csv arguments parsing header-less rows in dialect into columns 0..n_columns-1 (or usecols)."""
+    # columns are addressed by position so header names are written back verbatim;
+    # short rows are padded with "" and cells past n_columns are ignored (see check_row_widths)
+    return dict(sep=dialect.delimiter, quotechar=dialect.quotechar, escapechar=dialect.escapechar,
+                doublequote=dialect.doublequote, skipinitialspace=dialect.skipinitialspace, header=None,
+                names=range(n_columns), usecols=range(n_columns) if usecols is None else usecols, dtype=dtype,
+                keep_default_na=False, na_values=na_values, encoding=encoding, encoding_errors="replace")
+
+
+def dialect_write_kwargs(dialect) -> dict:
+    """Return the to_csv arguments writing cells the way csv.writer(f, dialect) does."""
+    return dict(sep=dialect.delimiter, quotechar=dialect.quotechar, quoting=dialect.quoting,
+                escapechar=dialect.escapechar, doublequote=dialect.doublequote, lineterminator=dialect.lineterminator)
+
+
+def split_points(mm, start: int, n_parts: int):
+    """Return offsets [start, ..., len(mm)] cutting mm[start:] into at most n_parts newline-aligned ranges."""
+    size = len(mm)
+    points = [start]
+    step = max((size - start) // n_parts, 1)
+    for k in range(1, n_parts):
+        pos = mm.find(b"\n", max(start + k * step, points[-1]))
+        if pos == -1 or pos + 1 >= size:
+            break
+        if pos + 1 > points[-1]:
+            points.append(pos + 1)
+    points.append(size)
+    return points
+
+
+def _run_part(transform, input_path, start, end, part_path, read_kwargs, write_kwargs, encoding):
+    with open(input_path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        data = mm[start:end]
+    try:
+        chunk = pd.read_csv(io.BytesIO(data), **read_kwargs)
+    except pd.errors.EmptyDataError:
+        # range holding only blank lines
+        open(part_path, "wb").close()
+        return 0
+    out, count = transform(chunk)
+    with open(part_path, "w", newline="", encoding=encoding) as outf:
+        out.to_csv(outf, header=False, index=False, **write_kwargs)
+    return count
+
+
+def parallel_map(transform, input_path: str, output_path: str, new_header, n_columns: int, dialect=csv.excel,
+                 encoding: str = "utf-8", workers: int = None, dtype=str,
+                 na_values=None) -> int:
+    """Write new_header and transform(chunk) of every data row of input_path to output_path.
+
+    transform must be a module-level function (or functools.partial of one) taking a DataFrame whose columns
+    are the positions 0..n_columns-1 as text (or as given by dtype and na_values), and returning (new DataFrame, count).
+    Returns the summed counts. Callers reject rows wider than n_columns beforehand (check_row_widths).
+    """
+    workers = workers or os.cpu_count() or 1
+    read_kwargs = dialect_read_kwargs(dialect, n_columns, encoding, dtype=dtype, na_values=na_values)
+    write_kwargs = dialect_write_kwargs(dialect)
+    # parts are appended after the header, so they must not carry their own byte order mark
+    part_encoding = "utf-8" if codecs.lookup(encoding).name == "utf-8-sig" else encoding
+
+    with open(input_path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        header_end = mm.find(b"\n") + 1 or size
+        n_parts = max(workers, -(-(size - header_end) // PART_SIZE))
+        points = split_points(mm, header_end, n_parts) if header_end < size else [size]
+
+    part_dir = tempfile.mkdtemp(prefix="parallel_map_", dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        part_paths = [os.path.join(part_dir, f"part{k}.csv") for k in range(len(points) - 1)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_run_part, transform, input_path, points[k], points[k + 1], part_paths[k],
+                                   read_kwargs, write_kwargs, part_encoding)
+                       for k in range(len(part_paths))]
+            total = sum(f.result() for f in futures)
+
+        with open(output_path, "w", newline="", encoding=encoding) as outf:
+            csv.writer(outf, dialect).writerow(new_header)
+        with open(output_path, "ab") as outf:
+            for part_path in part_paths:
+                with open(part_path, "rb") as pf:
+                    shutil.copyfileobj(pf, outf)
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+    return total
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Run the post-merge cleaning steps over a CSV in a single pass.
+
+Applies, in order, the same transformations as:
+ - replace_minus999.py      (cells equal to -999 become empty)
+ - remove_empty_column.py   (columns with an empty/unnamed header are dropped)
+ - transform_date_time.py   (f_data -> f_day,f_month,f_year and f_hora_utc -> hour_sin,hour_cos)
+ - one_hot_encode_bioma.py  (f_bioma -> one bioma_* column per category)
+
+Usage:
+    python pipeline.py -i path/to/merged.csv
+
+Instead of rewriting the whole file once per step, rows are read once in chunks, every step is applied
+to the chunk and the result is written once. The one-hot categories are collected beforehand by parsing
+only the f_bioma column. Creates a backup with .bak suffix.
+"""
+
+import argparse
+import csv
+import os
+import tempfile
+
+import pandas as pd
+
+from backup import backup_and_replace
+from one_hot_encode_bioma import collect_categories, find_column_index, one_hot_matrix, sanitize_categories
+from parallel_map import check_row_widths, dialect_read_kwargs, dialect_write_kwargs
+from remove_empty_column import empty_header_indices
+from replace_minus999 import minus999_mask
+from transform_date_time import header_positions, hours_to_sin_cos, split_dates
+
+CHUNK_SIZE = 200_000
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+def run_pipeline(input_path: str, inplace: bool = True, encoding: str = "utf-8", dialect: str = "excel",
+                 chunksize: int = CHUNK_SIZE, bioma_column: str = "f_bioma") -> int:
+    input_path = os.path.abspath(input_path)
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(f"Input file not found: {input_path}")
+
+    dialect = csv.get_dialect(dialect)
+    with open(input_path, "r", newline="", encoding=encoding, errors="replace") as fh:
+        try:
+            header = next(csv.reader(fh, dialect))
+        except StopIteration:
+            raise ValueError("Input CSV is empty")
+    check_row_widths(input_path, len(header), dialect, encoding)
+
+
+    drop_idxs = set(empty_header_indices(header))
+    positions = header_positions(header)
+    data_idx = positions.get("f_data")
+    hora_idx = positions.get("f_hora_utc")
+    bioma_idx = find_column_index(header, bioma_column)
+
+    categories = []
+    if bioma_idx is not None:
+        # only the bioma column is parsed here; -999 counts as empty, as it would after replace_minus999
+        bioma = pd.read_csv(input_path, skiprows=1,
+                            **dialect_read_kwargs(dialect, len(header), encoding, usecols=[bioma_idx]))[bioma_idx]
+        categories = collect_categories(bioma.mask(minus999_mask(bioma), "").str.strip())
+    sanitized = sanitize_categories(categories)
+
+    new_header = []
+    for i, col in enumerate(header):
+        if i in drop_idxs or (i == bioma_idx and sanitized):
+            continue
+        if i == data_idx:
+            new_header.extend(["f_day", "f_month", "f_year"])
+        elif i == hora_idx:
+            new_header.extend(["hour_sin", "hour_cos"])
+        else:
+            new_header.append(col)
+    new_header += [f"bioma_{name}" for (_, name) in sanitized]
+
+    fd, temp_path = tempfile.mkstemp(prefix="pipeline_", suffix=".csv", dir=os.path.dirname(input_path))
+    os.close(fd)
+
+    replacements = 0
+    with open(temp_path, "w", newline="", encoding=encoding, buffering=WRITE_BUFFER_SIZE) as outf:
+        csv.writer(outf, dialect).writerow(new_header)
+        for chunk in pd.read_csv(input_path, skiprows=1, chunksize=chunksize,
+                                 **dialect_read_kwargs(dialect, len(header), encoding)):
+            mask = chunk.apply(minus999_mask)
+            replacements += int(mask.to_numpy().sum())
+            chunk = chunk.mask(mask, "")
+
+            parts = []
+            for i in range(len(header)):
+                if i in drop_idxs or (i == bioma_idx and sanitized):
+                    continue
+                if i == data_idx:
+                    parts.append(split_dates(chunk[i]))
+                elif i == hora_idx:
+                    parts.append(hours_to_sin_cos(chunk[i]))
+                else:
+                    parts.append(chunk[i])
+            if sanitized:
+                parts.append(pd.DataFrame(one_hot_matrix(chunk[bioma_idx].str.strip(), categories), index=chunk.index))
+
+            out = pd.concat(parts, axis=1)
+            out.to_csv(outf, header=False, index=False, **dialect_write_kwargs(dialect))
+
+    summary = (f"Replaced {replacements} -999 cells, removed {len(drop_idxs)} empty/unnamed column(s), "
+               f"one-hot encoded {len(sanitized)} categories.")
+    if inplace:
+        backup_path = backup_and_replace(temp_path, input_path)
+        print(f"{summary} Backup: {backup_path}")
+    else:
+        out_name = input_path.replace('.csv', '.processed.csv')
+        os.replace(temp_path, out_name)
+        print(f"{summary} Output: {out_name}")
+    return replacements
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run replace_minus999, remove_empty_column, transform_date_time and one_hot_encode_bioma in one pass")
+    parser.add_argument("-i", "--input", required=True, help="Path to input CSV file")
+    parser.add_argument("--no-inplace", dest="inplace", action="store_false", help="Do not overwrite original; write to a new file")
+    parser.add_argument("--encoding", default="utf-8", help="File encoding (default utf-8). Try utf-8-sig if you have BOM)")
+    parser.add_argument("--dialect", default="excel", choices=csv.list_dialects(), help="CSV dialect of the input (default excel: comma-delimited)")
+    parser.add_argument("--column", default="f_bioma", help="Column name to one-hot encode (default f_bioma)")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE, help=f"Rows read per chunk (default {CHUNK_SIZE})")
+    args = parser.parse_args()
+
+    try:
+        run_pipeline(args.input, inplace=args.inplace, encoding=args.encoding, dialect=args.dialect,
+                     chunksize=args.chunksize, bioma_column=args.column)
+    except Exception as e:
+        print("Error:", e)
+        raise
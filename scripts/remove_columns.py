@@ -9,8 +9,11 @@ If output_csv is omitted, the script writes to <input_basename>_no_cols.csv next
 import csv
 import sys
 from pathlib import Path
-from datetime import datetime, timedelta
 
+import pandas as pd
+
+CHUNK_SIZE = 200_000
+WRITE_BUFFER_SIZE = 1 << 20
 COLUMNS_TO_REMOVE = {"pais", "satelite", "id_area_industrial"}
 
 
@@ -56,72 +59,45 @@ def remove_columns(input_path: Path, output_path: Path):
             else:
                 new_header.append(h)
 
-        with output_path.open("w", encoding="utf-8", newline="") as wf:
-            writer = csv.writer(wf)
-            writer.writerow(new_header)
-            # Copy remaining rows
-            for row in reader:
-                # If row shorter than header, pad
-                if len(row) < len(header):
-                    row = row + [""] * (len(header) - len(row))
-
-                # Try to parse and round data_pas if present
-                parsed_dt = None
-                original = ""
-                if data_pas_idx is not None and data_pas_idx < len(row):
-                    original = row[data_pas_idx].strip()
-                    if original:
-                        parsed_dt = _round_datetime_string_to_hour(original)
-
-                # Build output row, replacing data_pas by two columns when applicable
-                out_row = []
-                for i in range(len(header)):
-                    if i in to_drop_idx:
-                        continue
-                    if i == data_pas_idx:
-                        if parsed_dt is not None:
-                            date_str = parsed_dt.strftime("%d/%m/%Y")
-                            time_str = parsed_dt.strftime("%H%M") + " UTC"
-                            out_row.append(date_str)
-                            out_row.append(time_str)
-                        else:
-                            # If not parseable, keep original in first column and leave time empty
-                            out_row.append(original)
-                            out_row.append("")
-                    else:
-                        out_row.append(row[i])
-
-                writer.writerow(out_row)
+    # Remaining rows are read by pandas in chunks as text, addressed by column position;
+    # short rows are padded with "" and extra trailing cells are ignored
+    chunks = pd.read_csv(input_path, header=None, skiprows=1, names=range(len(header)), usecols=range(len(header)),
+                         dtype=str, keep_default_na=False, chunksize=CHUNK_SIZE, encoding="utf-8")
+    with output_path.open("w", encoding="utf-8", newline="", buffering=WRITE_BUFFER_SIZE) as wf:
+        writer = csv.writer(wf)
+        writer.writerow(new_header)
+        for chunk in chunks:
+            out = chunk.drop(columns=sorted(to_drop_idx))
+            if data_pas_idx is not None:
+                # Replace data_pas by two columns; unparseable values keep the original in the first one
+                original = chunk[data_pas_idx].str.strip()
+                parsed_dt = _round_datetime_column_to_hour(original)
+                parsed = parsed_dt.notna()
+                date_str = parsed_dt.dt.strftime("%d/%m/%Y").where(parsed, original)
+                time_str = (parsed_dt.dt.strftime("%H%M") + " UTC").where(parsed, "")
+                out[data_pas_idx] = date_str
+                out.insert(out.columns.get_loc(data_pas_idx) + 1, "hora_utc", time_str)
+            out.to_csv(wf, header=False, index=False, lineterminator=writer.dialect.lineterminator)
 
     print(f"Removidas colunas: {removed}")
     print(f"Arquivo de saída escrito em: {output_path}")
 
 
-def _round_datetime_string_to_hour(s: str) -> datetime | None:
-    """Tenta parsear uma string de data/hora e arredondar para a hora mais próxima.
+def _round_datetime_column_to_hour(col: pd.Series) -> pd.Series:
+    """Tenta parsear uma coluna de strings de data/hora e arredondar cada valor para a hora mais próxima.
 
-    Retorna um objeto datetime (com minutos/segundos zerados, possivelmente incrementado em 1 hora)
-    ou None se não foi possível parsear.
+    Retorna uma Series de datetimes (com minutos/segundos zerados, possivelmente incrementados em 1 hora)
+    com NaT onde não foi possível parsear.
     """
-    # formatos comuns esperados
+    # formatos comuns esperados; cada valor fica com o primeiro formato que o parseia
     formats = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M"]
-    dt = None
+    dt = pd.Series(pd.NaT, index=col.index, dtype="datetime64[s]")
     for fmt in formats:
-        try:
-            dt = datetime.strptime(s, fmt)
-            break
-        except Exception:
-            continue
-    if dt is None:
-        return None
-
-    # compute rounding: if minutes >= 30 -> round up, else down
-    if dt.minute >= 30 or (dt.minute == 29 and dt.second >= 30):
-        dt = (dt.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1))
-    else:
-        dt = dt.replace(minute=0, second=0, microsecond=0)
+        dt = dt.fillna(pd.to_datetime(col, format=fmt, errors="coerce"))
 
-    return dt
+    # compute rounding: if minutes >= 30 (or 29:30 and beyond) -> round up, else down
+    seconds = dt.dt.minute * 60 + dt.dt.second
+    return dt.dt.floor("h") + pd.to_timedelta((seconds >= 29 * 60 + 30).astype(int), unit="h")
 
 
 if __name__ == "__main__":
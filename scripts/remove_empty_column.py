@@ -5,36 +5,46 @@ Usage:
     python remove_empty_column.py -i path/to/file.csv
 
 This script:
- - Detects CSV dialect with csv.Sniffer
+ - Reads the CSV with a known dialect (default excel, selectable with --dialect)
  - Finds header columns whose name is empty/whitespace or starts with 'Unnamed'
  - Rewrites the CSV without those columns, creating a backup with suffix .bak
- - Streams rows so it works for large files
+ - Streams rows so it works for large files (or splits them across processes with --workers)
+
+--engine pyarrow reads the rows with Arrow's multithreaded CSV reader instead; it needs the pyarrow package
+and rows with exactly as many cells as the header.
 """
 
 import argparse
 import csv
 import os
-import shutil
 import tempfile
+from functools import partial
+from operator import itemgetter
+
+from arrow_csv import read_chunks_pyarrow
+from backup import backup_and_replace
+from parallel_map import check_row_widths, dialect_write_kwargs, parallel_map
+
+
+def empty_header_indices(header):
+    # header that is empty/whitespace or 'Unnamed...'
+    return [i for i, col in enumerate(header) if (col is None) or (str(col).strip() == "") or str(col).strip().lower().startswith("unnamed")]
 
 
-def remove_empty_header_columns(input_path: str, inplace: bool = True, encoding: str = "utf-8") -> int:
+def select_columns(keep_idx, chunk):
+    """Keep only the columns at positions keep_idx of a chunk; count is always 0."""
+    return chunk[list(keep_idx)], 0
+
+
+def remove_empty_header_columns(input_path: str, inplace: bool = True, encoding: str = "utf-8", dialect: str = "excel",
+                                workers: int = 1, engine: str = "c") -> int:
     input_path = os.path.abspath(input_path)
     if not os.path.exists(input_path):
         raise FileNotFoundError(f"Input file not found: {input_path}")
 
-    # Prepare temporary output
-    fd, temp_path = tempfile.mkstemp(prefix="remove_empty_col_", suffix=".csv", dir=os.path.dirname(input_path))
-    os.close(fd)
+    dialect = csv.get_dialect(dialect)
 
     with open(input_path, "r", newline="", encoding=encoding, errors="replace") as inf:
-        sample = inf.read(8192)
-        inf.seek(0)
-        try:
-            dialect = csv.Sniffer().sniff(sample)
-        except Exception:
-            dialect = csv.excel
-
         reader = csv.reader(inf, dialect)
         try:
             header = next(reader)
@@ -42,39 +52,56 @@ def remove_empty_header_columns(input_path: str, inplace: bool = True, encoding:
             raise ValueError("Input CSV is empty")
 
         # Determine indices to remove: header that is empty/whitespace or 'Unnamed...'
-        remove_idxs = [i for i, col in enumerate(header) if (col is None) or (str(col).strip() == "") or str(col).strip().lower().startswith("unnamed")]
+        remove_idxs = empty_header_indices(header)
 
         if not remove_idxs:
-            # nothing to remove; clean up temp and return
-            os.remove(temp_path)
+            # nothing to remove
             print("No unnamed/empty header columns found.")
             return 0
 
         # Build output header
         new_header = [col for i, col in enumerate(header) if i not in remove_idxs]
 
-        with open(temp_path, "w", newline="", encoding=encoding) as outf:
-            writer = csv.writer(outf, dialect)
-            writer.writerow(new_header)
-            removed_count_rows = 0
-            for row in reader:
-                # Pad row if shorter than header
-                if len(row) < len(header):
-                    row = row + [""] * (len(header) - len(row))
-                new_row = [cell for i, cell in enumerate(row) if i not in remove_idxs]
-                writer.writerow(new_row)
-                removed_count_rows += 1
+        # itemgetter pulls every kept cell of a row in a single C call; with one index it returns a bare value
+        keep_idx = tuple(i for i in range(len(header)) if i not in remove_idxs)
+        getter = itemgetter(*keep_idx) if keep_idx else (lambda row: ())
+        single = len(keep_idx) == 1
+
+        check_row_widths(input_path, len(header), dialect, encoding)
+        # Prepare temporary output
+        fd, temp_path = tempfile.mkstemp(prefix="remove_empty_col_", suffix=".csv", dir=os.path.dirname(input_path))
+        os.close(fd)
+
+        if workers > 1:
+            parallel_map(partial(select_columns, keep_idx), input_path, temp_path, new_header, len(header),
+                         dialect=dialect, encoding=encoding, workers=workers)
+        elif engine == "pyarrow":
+            with open(temp_path, "w", newline="", encoding=encoding) as outf:
+                csv.writer(outf, dialect).writerow(new_header)
+                for chunk in read_chunks_pyarrow(input_path, len(header), dialect, encoding):
+                    chunk[list(keep_idx)].to_csv(outf, header=False, index=False, **dialect_write_kwargs(dialect))
+        else:
+            with open(temp_path, "w", newline="", encoding=encoding) as outf:
+                writer = csv.writer(outf, dialect)
+                writer.writerow(new_header)
+                removed_count_rows = 0
+                for row in reader:
+                    try:
+                        new_row = getter(row)
+                    except IndexError:
+                        # Pad row if shorter than header; only malformed rows take this path
+                        new_row = getter(row + [""] * (len(header) - len(row)))
+                    writer.writerow((new_row,) if single else new_row)
+                    removed_count_rows += 1
 
     # Backup and move into place
     if inplace:
-        backup_path = input_path + ".bak"
-        shutil.copy2(input_path, backup_path)
-        shutil.move(temp_path, input_path)
+        backup_path = backup_and_replace(temp_path, input_path)
         print(f"Removed {len(remove_idxs)} empty/unnamed column(s). Original backed up to: {backup_path}")
         return len(remove_idxs)
     else:
         out_name = input_path.replace('.csv', '.cleaned.csv')
-        shutil.move(temp_path, out_name)
+        os.replace(temp_path, out_name)
         print(f"Removed {len(remove_idxs)} empty/unnamed column(s). Output written to: {out_name}")
         return len(remove_idxs)
 
@@ -84,10 +111,17 @@ if __name__ == "__main__":
     parser.add_argument("-i", "--input", required=True, help="Path to input CSV file")
     parser.add_argument("--no-inplace", dest="inplace", action="store_false", help="Do not overwrite original; write to a new file")
     parser.add_argument("--encoding", default="utf-8", help="File encoding (default utf-8). Try utf-8-sig if needed)")
+    parser.add_argument("--dialect", default="excel", choices=csv.list_dialects(), help="CSV dialect of the input (default excel: comma-delimited)")
+    parser.add_argument("--engine", choices=("c", "pyarrow"), default="c",
+                        help="CSV reader: 'c' (csv module, default) or 'pyarrow' (Arrow, multithreaded; requires pyarrow)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes; above 1 the rows are split across processes with the pandas reader, "
+                             "whatever --engine says (default 1)")
     args = parser.parse_args()
 
     try:
-        remove_empty_header_columns(args.input, inplace=args.inplace, encoding=args.encoding)
+        remove_empty_header_columns(args.input, inplace=args.inplace, encoding=args.encoding, dialect=args.dialect,
+                                    workers=args.workers, engine=args.engine)
     except Exception as e:
         print("Error:", e)
         raise
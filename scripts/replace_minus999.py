@@ -4,71 +4,116 @@ Creates a backup of the original file with extension .bak before overwriting.
 Usage:
     python replace_minus999.py -i "path/to/file.csv"
 
-This script uses the stdlib csv module and streams rows so it works for large files.
+This script reads the file with pandas in chunks and compares whole columns at once, so it works for large files.
+Columns listed in --numeric-columns are parsed as floats by the reader and compared with a single numpy equality;
+their values are then written back in pandas' float format (e.g. 1.50 -> 1.5, 56 -> 56.0).
+--engine pyarrow reads the chunks with Arrow's multithreaded CSV reader instead; it needs the pyarrow package
+and rows with exactly as many cells as the header.
 """
 
 import csv
 import argparse
-import shutil
 import tempfile
 import os
+import re
 
+import numpy as np
+import pandas as pd
 
-def process(input_path: str, inplace: bool = True, encoding: str = "utf-8") -> int:
+from arrow_csv import read_chunks_pyarrow
+from backup import backup_and_replace
+from parallel_map import check_row_widths, dialect_read_kwargs, dialect_write_kwargs, parallel_map
+
+CHUNK_SIZE = 200_000
+WRITE_BUFFER_SIZE = 1 << 20
+
+_MINUS999_RE = re.compile(r"\s*-0*999(?:\.0*)?\s*")
+_SCIENTIFIC_NEGATIVE_RE = re.compile(r"-.*[eE]")
+
+
+def minus999_mask(col: pd.Series) -> pd.Series:
+    """Return a boolean mask of the cells whose numeric value is -999 (e.g. '-999', '-999.0', ' -999 ')."""
+    if col.dtype.kind == "f":
+        # already parsed to floats by the reader: one vectorised comparison over the array
+        return pd.Series(col.to_numpy() == -999.0, index=col.index)
+    # plain decimal spellings are recognised by the precompiled pattern, without parsing any float
+    mask = col.str.fullmatch(_MINUS999_RE).to_numpy(dtype=bool, copy=True)
+    # scientific notation (e.g. '-9.99e2') is the only other way to write -999; just those cells are parsed
+    candidates = col.str.contains(_SCIENTIFIC_NEGATIVE_RE).to_numpy(dtype=bool)
+    if candidates.any():
+        mask[candidates] = (pd.to_numeric(col[candidates].str.strip(), errors="coerce") == -999.0).to_numpy()
+    return pd.Series(mask, index=col.index)
+
+
+def replace_chunk(chunk: pd.DataFrame):
+    """Blank out the -999 cells of a chunk; return the new chunk and the number of replaced cells."""
+    mask = chunk.apply(minus999_mask)
+    # masked cells become NaN, which is written as an empty cell and keeps float columns numeric
+    return chunk.mask(mask), int(mask.to_numpy().sum())
+
+
+def process(input_path: str, inplace: bool = True, encoding: str = "utf-8", chunksize: int = CHUNK_SIZE,
+            dialect: str = "excel", workers: int = 1, numeric_columns=(), engine: str = "c") -> int:
     input_path = os.path.abspath(input_path)
     if not os.path.exists(input_path):
         raise FileNotFoundError(f"Input file not found: {input_path}")
 
+    replacements = 0
+
+    dialect = csv.get_dialect(dialect)
+
+    with open(input_path, "r", newline="", encoding=encoding, errors="replace") as fh:
+        header = next(csv.reader(fh, dialect), [])
+    missing = set(numeric_columns) - set(header)
+    if missing:
+        raise ValueError(f"Numeric column(s) not found in header: {sorted(missing)}")
+    short_rows = check_row_widths(input_path, len(header), dialect, encoding)
+    if short_rows:
+        print(f"{short_rows} row(s) shorter than the header are written padded with empty cells.")
+    # cells are read as plain strings so untouched cells are written back verbatim, except in the numeric columns
+    dtype = {i: (np.float64 if name in numeric_columns else str) for i, name in enumerate(header)}
+    na_values = {i: [""] for i, name in enumerate(header) if name in numeric_columns}
+
     # Prepare temp output
     fd, temp_path = tempfile.mkstemp(prefix="replace_minus999_", suffix=".csv", dir=os.path.dirname(input_path))
     os.close(fd)
 
-    replacements = 0
+    try:
+        # an empty input has nothing to read; the temp file stays empty and becomes the empty output
+        if header:
+            # the header row is treated like any other row
+            new_header, replacements = replace_chunk(pd.DataFrame([header], dtype=str))
+            new_header = new_header.iloc[0].fillna("").tolist()
 
-    # Detect dialect from a sample
-    with open(input_path, "r", newline="", encoding=encoding, errors="replace") as fh:
-        sample = fh.read(8192)
-        fh.seek(0)
-        try:
-            dialect = csv.Sniffer().sniff(sample)
-        except Exception:
-            dialect = csv.excel
-
-        reader = csv.reader(fh, dialect)
-        with open(temp_path, "w", newline="", encoding=encoding) as out_fh:
-            writer = csv.writer(out_fh, dialect)
-            for row in reader:
-                new_row = []
-                for cell in row:
-                    replaced = cell
-                    # try numeric comparison; if cell is parseable as float and equals -999, replace
-                    stripped = cell.strip()
-                    if stripped == "":
-                        new_row.append(cell)
-                        continue
-                    try:
-                        num = float(stripped)
-                        if num == -999.0:
-                            replaced = ""
-                            replacements += 1
-                    except Exception:
-                        # fallback exact string match (handles cases like '-999')
-                        if stripped == "-999":
-                            replaced = ""
-                            replacements += 1
-                    new_row.append(replaced)
-                writer.writerow(new_row)
+            if workers > 1:
+                replacements += parallel_map(replace_chunk, input_path, temp_path, new_header, len(header),
+                                             dialect=dialect, encoding=encoding, workers=workers, dtype=dtype, na_values=na_values)
+            else:
+                if engine == "pyarrow":
+                    reader = read_chunks_pyarrow(input_path, len(header), dialect, encoding, float_columns=na_values)
+                else:
+                    reader = pd.read_csv(input_path, skiprows=1, chunksize=chunksize,
+                                         **dialect_read_kwargs(dialect, len(header), encoding, dtype=dtype,
+                                                               na_values=na_values))
+                with open(temp_path, "w", newline="", encoding=encoding, buffering=WRITE_BUFFER_SIZE) as out_fh:
+                    csv.writer(out_fh, dialect).writerow(new_header)
+                    for chunk in reader:
+                        chunk, count = replace_chunk(chunk)
+                        replacements += count
+                        chunk.to_csv(out_fh, header=False, index=False, **dialect_write_kwargs(dialect))
+    except BaseException:
+        # e.g. text in a --numeric-columns column; do not leave the partial output behind
+        os.remove(temp_path)
+        raise
 
     # Backup original and move temp into place if inplace
     if inplace:
-        backup_path = input_path + ".bak"
-        shutil.copy2(input_path, backup_path)
-        shutil.move(temp_path, input_path)
+        backup_path = backup_and_replace(temp_path, input_path)
         print(f"Replaced {replacements} cells. Original backed up to: {backup_path}")
         return replacements
     else:
         out_name = input_path.replace('.csv', '.replaced.csv')
-        shutil.move(temp_path, out_name)
+        os.replace(temp_path, out_name)
         print(f"Replaced {replacements} cells. Output written to: {out_name}")
         return replacements
 
@@ -78,10 +123,20 @@ if __name__ == "__main__":
     parser.add_argument("-i", "--input", required=True, help="Path to input CSV file")
     parser.add_argument("--no-inplace", dest="inplace", action="store_false", help="Do not overwrite original; write to a new file")
     parser.add_argument("--encoding", default="utf-8", help="File encoding (default utf-8). Try utf-8-sig if you have BOM)")
+    parser.add_argument("--dialect", default="excel", choices=csv.list_dialects(), help="CSV dialect of the input (default excel: comma-delimited)")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE, help=f"Rows read per chunk (default {CHUNK_SIZE})")
+    parser.add_argument("--engine", choices=("c", "pyarrow"), default="c",
+                        help="CSV reader: 'c' (pandas, default) or 'pyarrow' (Arrow, multithreaded; requires pyarrow)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes; above 1 the rows are split across processes with the pandas reader, "
+                             "whatever --engine says (default 1)")
+    parser.add_argument("--numeric-columns", nargs="+", default=(), metavar="COLUMN",
+                        help="Columns holding only numbers; they are parsed as floats and rewritten in pandas' float format")
     args = parser.parse_args()
 
     try:
-        n = process(args.input, inplace=args.inplace, encoding=args.encoding)
+        n = process(args.input, inplace=args.inplace, encoding=args.encoding, chunksize=args.chunksize, dialect=args.dialect,
+                    workers=args.workers, numeric_columns=args.numeric_columns, engine=args.engine)
     except Exception as e:
         print("Error:", e)
         raise
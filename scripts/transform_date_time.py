@@ -5,10 +5,15 @@ Usage:
     python transform_date_time.py -i path/to/file.csv
 
 The script:
- - Detects CSV dialect
+ - Reads the CSV with a known dialect (default excel; --dialect, --delimiter and --quoting adjust it)
  - Locates columns `f_data` and `f_hora_utc` (case-insensitive)
  - Replaces those columns in-place with new numeric columns
  - Creates a backup with .bak suffix
+
+Rows are read with pandas in chunks and each column is converted at once (regex extraction and numpy sin/cos),
+so it works for large files. --engine pyarrow reads the chunks with Arrow's multithreaded CSV reader instead;
+it needs the pyarrow package and rows with exactly as many cells as the header. --workers N splits the rows
+across N processes.
 """
 
 import argparse
@@ -16,14 +21,67 @@ import csv
 import math
 import os
 import re
-import shutil
 import tempfile
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from arrow_csv import read_chunks_pyarrow
+from backup import backup_and_replace
+from parallel_map import check_row_widths, dialect_read_kwargs, dialect_write_kwargs, parallel_map
+
+CHUNK_SIZE = 200_000
+# the input is read once front to back and the output written the same way; large buffers mean fewer syscalls
+IO_BUFFER_SIZE = 8 << 20
+
+_DIGITS_RE = re.compile(r"\d+")
+# first three digit runs, as _DIGITS_RE.findall(s)[:3] in parse_date_to_dmy
+_DATE_PARTS_RE = r"(\d+)(?:\D+(\d+))?(?:\D+(\d+))?"
+# longer hour tokens could lose precision as float64; those cells go through parse_time_to_fraction
+_MAX_VECTOR_TOKEN_LEN = 15
+# layouts of the focos file ('02/01/2024', '0600 UTC'): their digit runs sit at fixed offsets and are sliced out
+_FIXED_DATE_RE = r"[0-9]{2}[^0-9][0-9]{2}[^0-9][0-9]{4}"
+_FIXED_HOUR_RE = r"[0-9]{4} UTC"
+QUOTING = {"minimal": csv.QUOTE_MINIMAL, "all": csv.QUOTE_ALL, "nonnumeric": csv.QUOTE_NONNUMERIC,
+           "none": csv.QUOTE_NONE}
+
+# regex spelling of the line break characters a cell may hold
+_REGEX_CHAR_ESCAPES = {"\r": "\\r", "\n": "\\n"}
+
+# hours have minute resolution, so sin/cos of the day angle only ever takes these 1440 values
+MINUTES_PER_DAY = 1440
+_SIN_TABLE = np.sin((2 * np.pi) * np.arange(MINUTES_PER_DAY) / float(MINUTES_PER_DAY))
+_COS_TABLE = np.cos((2 * np.pi) * np.arange(MINUTES_PER_DAY) / float(MINUTES_PER_DAY))
+# and as the text written to the file, plus a trailing "" for cells without an hour
+_SIN_TEXT = np.array([f"{v:.6f}" for v in _SIN_TABLE] + [""], dtype=object)
+_COS_TEXT = np.array([f"{v:.6f}" for v in _COS_TABLE] + [""], dtype=object)
+
+
+def resolve_dialect(dialect: str = "excel", delimiter: str = None, quoting: str = None):
+    """Return the named csv dialect, with its delimiter and/or output quoting (a QUOTING key) replaced when given."""
+    base = csv.get_dialect(dialect)
+    attrs = {name: getattr(base, name) for name in ("delimiter", "quotechar", "escapechar", "doublequote",
+                                                    "skipinitialspace", "lineterminator", "quoting", "strict")}
+    if delimiter is not None:
+        attrs["delimiter"] = delimiter
+    if quoting is not None:
+        attrs["quoting"] = QUOTING[quoting]
+    return type("Dialect", (csv.Dialect,), attrs)
+
+
+def header_positions(header):
+    """Map each lowercased header name to the index of its first occurrence, built in one pass."""
+    positions = {}
+    for i, name in enumerate(header):
+        positions.setdefault(name.lower(), i)
+    return positions
 
 
 def parse_date_to_dmy(s: str):
     if not s:
         return ("", "", "")
-    parts = re.findall(r"\d+", s)
+    parts = _DIGITS_RE.findall(s)
     if not parts:
         return ("", "", "")
     # Expect day, month, year in that order
@@ -40,24 +98,30 @@ def parse_time_to_fraction(s: str):
     """Return fraction of day (0..1) for time string like '1700 UTC' or '04:00' or '4'"""
     if not s:
         return None
-    digits = re.findall(r"\d+", s)
-    if not digits:
+    # accumulate the first run of digits as an integer in a single pass, counting its digits
+    value = n_digits = 0
+    for c in s:
+        d = ord(c) - 48
+        if not 0 <= d <= 9:
+            if c.isdecimal():
+                # non-ASCII decimal digit, as matched by \d
+                d = int(c)
+            elif n_digits:
+                break
+            else:
+                continue
+        value = value * 10 + d
+        n_digits += 1
+    if not n_digits:
         return None
-    token = digits[0]
     # token may be '1700' or '4' or '04'
-    if len(token) >= 3:
+    if n_digits >= 3:
         # treat last two as minutes
-        hh = int(token[:-2])
-        mm = int(token[-2:])
+        hh, mm = divmod(value, 100)
     else:
-        hh = int(token)
-        mm = 0
-    if not (0 <= hh <= 23 and 0 <= mm <= 59):
-        # try to clamp or return None
-        hh = hh % 24
-        mm = mm % 60
-    fraction = (hh + mm / 60.0) / 24.0
-    return fraction
+        hh, mm = value, 0
+    # out-of-range values wrap around
+    return (hh % 24 + (mm % 60) / 60.0) / 24.0
 
 
 def time_fraction_to_sin_cos(frac: float):
@@ -66,38 +130,119 @@ def time_fraction_to_sin_cos(frac: float):
     return math.sin(angle), math.cos(angle)
 
 
-def transform_file(input_path: str, inplace: bool = True, encoding: str = "utf-8"):
+def split_dates(col: pd.Series) -> pd.DataFrame:
+    """Column-wise parse_date_to_dmy: return the day, month and year of every cell as three text columns."""
+    parts = pd.DataFrame({0: col.str[0:2], 1: col.str[3:5], 2: col.str[6:10]})
+    other = ~col.str.fullmatch(_FIXED_DATE_RE, na=False).to_numpy(dtype=bool)
+    if other.any():
+        # cells not in the dd/mm/yyyy layout go through the general digit-run extraction
+        rest = col[other].str.extract(_DATE_PARTS_RE).fillna("")
+        year = rest[2]
+        short = year.str.len() == 2
+        if short.any():
+            # assume 2000s
+            rest.loc[short, 2] = (year[short].astype(int) + 2000).astype(str)
+        parts.loc[other] = rest
+    return parts
+
+
+def hours_to_minutes(col: pd.Series) -> np.ndarray:
+    """Column-wise parse_time_to_fraction: return the minute of day (0..1439) of every cell, NaN where it has no digits."""
+    fixed = col.str.fullmatch(_FIXED_HOUR_RE, na=False).to_numpy(dtype=bool)
+    if fixed.all():
+        hhmm = col.str[0:4].astype(np.int64).to_numpy()
+        return (hhmm // 100 % 24 * 60 + hhmm % 100 % 60).astype(np.float64)
+    if fixed.any():
+        minutes = np.empty(len(col), dtype=np.float64)
+        minutes[fixed] = hours_to_minutes(col[fixed])
+        minutes[~fixed] = hours_to_minutes(col[~fixed])
+        return minutes
+    token = col.str.extract(r"(\d+)", expand=False)
+    # token may be '1700' or '4' or '04'; with 3+ digits the last two are minutes
+    long_token = (token.str.len() >= 3).to_numpy(dtype=bool)
+    hh = pd.to_numeric(token.where(~long_token, token.str[:-2]), errors="coerce").to_numpy(dtype=np.float64)
+    mm = pd.to_numeric(token.str[-2:].where(long_token, "0"), errors="coerce").to_numpy(dtype=np.float64)
+    minutes = hh % 24 * 60 + mm % 60
+    odd = (token.notna() & (np.isnan(minutes) | (token.str.len() > _MAX_VECTOR_TOKEN_LEN))).to_numpy(dtype=bool)
+    if odd.any():
+        # the Python parser runs once per distinct odd cell, not once per row
+        codes, uniques = pd.factorize(col[odd])
+        fractions = np.array([parse_time_to_fraction(v.strip()) for v in uniques], dtype=np.float64)
+        minutes[odd] = np.round(fractions * MINUTES_PER_DAY)[codes]
+    return minutes
+
+
+def hours_to_sin_cos(col: pd.Series) -> pd.DataFrame:
+    """Return hour_sin and hour_cos of every cell as two text columns with 6 decimals ('' where the hour cannot be parsed)."""
+    minutes = hours_to_minutes(col)
+    # cells without an hour index the trailing ""
+    idx = np.where(np.isnan(minutes), MINUTES_PER_DAY, minutes).astype(np.intp)
+    return pd.DataFrame({0: _SIN_TEXT[idx], 1: _COS_TEXT[idx]}, index=col.index)
+
+
+def transform_chunk(chunk: pd.DataFrame, data_idx, hora_idx) -> pd.DataFrame:
+    """Replace the date column by day/month/year and the hour column by its sin/cos; other columns are kept."""
+    # untouched columns are carried over as whole slices between the converted ones
+    parts = []
+    start = 0
+    for i in sorted(i for i in (data_idx, hora_idx) if i is not None):
+        parts.append(chunk.iloc[:, start:i])
+        parts.append(split_dates(chunk[i]) if i == data_idx else hours_to_sin_cos(chunk[i]))
+        start = i + 1
+    parts.append(chunk.iloc[:, start:])
+    return pd.concat(parts, axis=1)
+
+
+def transform_part(data_idx, hora_idx, chunk: pd.DataFrame):
+    """transform_chunk in the (chunk, count) form expected by parallel_map; count is always 0."""
+    return transform_chunk(chunk, data_idx, hora_idx), 0
+
+
+def write_chunk(outf, frame: pd.DataFrame, dialect):
+    """Write the rows of a DataFrame of text columns to outf as CSV in the given dialect."""
+    if (dialect.quoting != csv.QUOTE_MINIMAL or not dialect.doublequote or dialect.escapechar is not None
+            or dialect.skipinitialspace or frame.shape[1] < 2):
+        frame.to_csv(outf, header=False, index=False, **dialect_write_kwargs(dialect))
+        return
+    q = dialect.quotechar
+    special = "[" + "".join(_REGEX_CHAR_ESCAPES.get(c, re.escape(c))
+                            for c in set(dialect.delimiter + q + dialect.lineterminator + "\r\n")) + "]"
+    cols = []
+    for k in range(frame.shape[1]):
+        col = frame.iloc[:, k]
+        # as csv.QUOTE_MINIMAL: only cells holding a delimiter, quote or line break are quoted
+        needs_quotes = col.str.contains(special, na=False)
+        if needs_quotes.any():
+            col = col.where(~needs_quotes, q + col.str.replace(q, q + q, regex=False) + q)
+        cols.append(col.to_numpy(dtype=object, na_value=""))
+    # rows are joined as plain strings, without the per-cell checks of the csv writer
+    term = dialect.lineterminator
+    outf.write(term.join(map(dialect.delimiter.join, zip(*cols))))
+    if len(frame):
+        outf.write(term)
+
+
+def transform_file(input_path: str, inplace: bool = True, encoding: str = "utf-8", chunksize: int = CHUNK_SIZE,
+                   engine: str = "c", workers: int = 1, dialect: str = "excel", delimiter: str = None,
+                   quoting: str = None):
     input_path = os.path.abspath(input_path)
     if not os.path.exists(input_path):
         raise FileNotFoundError(input_path)
 
-    fd, temp_path = tempfile.mkstemp(prefix="transform_dt_", suffix=".csv", dir=os.path.dirname(input_path))
-    os.close(fd)
-
+    dialect = resolve_dialect(dialect, delimiter, quoting)
     with open(input_path, "r", newline="", encoding=encoding, errors="replace") as inf:
-        sample = inf.read(8192)
-        inf.seek(0)
         try:
-            dialect = csv.Sniffer().sniff(sample)
-        except Exception:
-            dialect = csv.excel
-        reader = csv.reader(inf, dialect)
-        try:
-            header = next(reader)
+            # --quoting is for the output; the header is parsed like the data rows, which pandas reads quote-aware
+            header = next(csv.reader(inf, dialect, quoting=csv.QUOTE_MINIMAL))
         except StopIteration:
             raise ValueError("Empty CSV")
 
         # find indices for f_data and f_hora_utc (case-insensitive)
-        lowered = [h.lower() for h in header]
-        data_idx = None
-        hora_idx = None
-        if 'f_data' in lowered:
-            data_idx = lowered.index('f_data')
-        if 'f_hora_utc' in lowered:
-            hora_idx = lowered.index('f_hora_utc')
+        positions = header_positions(header)
+        data_idx = positions.get('f_data')
+        hora_idx = positions.get('f_hora_utc')
 
         if data_idx is None and hora_idx is None:
-            os.remove(temp_path)
             print("No f_data or f_hora_utc columns found; nothing to do.")
             return 0
 
@@ -111,40 +256,36 @@ def transform_file(input_path: str, inplace: bool = True, encoding: str = "utf-8
             else:
                 new_header.append(col)
 
-        # if both indices exist and hora_idx > data_idx, note that indices shift when writing but we handle per row
-
-        with open(temp_path, "w", newline="", encoding=encoding) as outf:
-            writer = csv.writer(outf, dialect)
-            writer.writerow(new_header)
-            for row in reader:
-                # pad
-                if len(row) < len(header):
-                    row = row + [""] * (len(header) - len(row))
-                out_row = []
-                for i, cell in enumerate(row):
-                    if i == data_idx:
-                        day, month, year = parse_date_to_dmy(cell.strip())
-                        out_row.extend([day, month, year])
-                    elif i == hora_idx:
-                        frac = parse_time_to_fraction(cell.strip())
-                        if frac is None:
-                            out_row.extend(["", ""])
-                        else:
-                            s, c = time_fraction_to_sin_cos(frac)
-                            out_row.extend([f"{s:.6f}", f"{c:.6f}"])
-                    else:
-                        out_row.append(cell)
-                writer.writerow(out_row)
+    check_row_widths(input_path, len(header), dialect, encoding)
+    fd, temp_path = tempfile.mkstemp(prefix="transform_dt_", suffix=".csv", dir=os.path.dirname(input_path))
+    os.close(fd)
+
+    if workers > 1:
+        # rows are independent, so byte ranges of the file are transformed in separate processes
+        parallel_map(partial(transform_part, data_idx, hora_idx), input_path, temp_path, new_header, len(header),
+                     dialect=dialect, encoding=encoding, workers=workers)
+    else:
+        with open(input_path, "rb", buffering=IO_BUFFER_SIZE) as raw, \
+                open(temp_path, "w", newline="", encoding=encoding, buffering=IO_BUFFER_SIZE) as outf:
+            if hasattr(os, "posix_fadvise"):
+                # tell the kernel the file is read sequentially so it reads ahead more aggressively
+                os.posix_fadvise(raw.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            if engine == "pyarrow":
+                reader = read_chunks_pyarrow(raw, len(header), dialect, encoding)
+            else:
+                reader = pd.read_csv(raw, skiprows=1, chunksize=chunksize,
+                                     **dialect_read_kwargs(dialect, len(header), encoding))
+            csv.writer(outf, dialect).writerow(new_header)
+            for chunk in reader:
+                write_chunk(outf, transform_chunk(chunk, data_idx, hora_idx), dialect)
 
     if inplace:
-        backup_path = input_path + ".bak"
-        shutil.copy2(input_path, backup_path)
-        shutil.move(temp_path, input_path)
+        backup_path = backup_and_replace(temp_path, input_path)
         print(f"Transformed date/time columns. Backup at {backup_path}")
         return 1
     else:
         out_name = input_path.replace('.csv', '.dt.csv')
-        shutil.move(temp_path, out_name)
+        os.replace(temp_path, out_name)
         print(f"Transformed date/time columns. Output at {out_name}")
         return 1
 
@@ -154,9 +295,20 @@ if __name__ == '__main__':
     parser.add_argument('-i', '--input', required=True, help='Path to CSV')
     parser.add_argument('--no-inplace', dest='inplace', action='store_false', help='Do not overwrite original')
     parser.add_argument('--encoding', default='utf-8', help='File encoding')
+    parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE, help=f'Rows read per chunk (default {CHUNK_SIZE})')
+    parser.add_argument('--engine', choices=('c', 'pyarrow'), default='c',
+                        help="CSV reader: 'c' (pandas, default) or 'pyarrow' (Arrow, multithreaded; requires pyarrow)")
+    parser.add_argument('--dialect', default='excel', choices=csv.list_dialects(),
+                        help='CSV dialect of the input (default excel: comma-delimited)')
+    parser.add_argument('--delimiter', help="Field delimiter, overriding the dialect's (e.g. ';')")
+    parser.add_argument('--quoting', choices=sorted(QUOTING), help="Quoting of the output cells, overriding the dialect's")
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes; above 1 the rows are split across processes with the pandas reader (default 1)')
     args = parser.parse_args()
     try:
-        transform_file(args.input, inplace=args.inplace, encoding=args.encoding)
+        transform_file(args.input, inplace=args.inplace, encoding=args.encoding, chunksize=args.chunksize,
+                       engine=args.engine, workers=args.workers, dialect=args.dialect, delimiter=args.delimiter,
+                       quoting=args.quoting)
     except Exception as e:
         print('Error:', e)
         raise